@@ -5,10 +5,7 @@ from typing import Any, List, Union, Tuple, Optional
 import numpy as np
 
 from mlcg.geometry._symmetrize import _symmetrise_distance_interaction
-from networkx.algorithms.shortest_paths.unweighted import (
-    bidirectional_shortest_path,
-)
-import networkx as nx
+from scipy.sparse.csgraph import dijkstra
 from mlcg.geometry.topology import (
     Topology,
     get_connectivity_matrix,
@@ -19,22 +16,22 @@ from .utils import get_dihedral_groups, split_bulk_termini
 from .embedding_maps import all_residues
 
 
-def check_graph_distance(
-    graph: nx.Graph, conn_comp: List[set], node_1: int, node_2: int, min_distance: int
-) -> bool:
-    """Function to check if the shortest path between to nodes in a graph is smaller than `min_distance`
+def pairs_in_edges(
+    pairs: np.ndarray, edges: Union[np.ndarray, List, None], n_atoms: int
+) -> np.ndarray:
+    """Function to check which (ordered) pairs are present among the columns of `edges`
 
-    This covers the case when the nodes are in different connected components before hand.
-    to save computation time.
+    Pairs are encoded as single integers so that the membership test is done in one
+    vectorized pass instead of comparing each pair against all edges.
     """
-    con_1 = [i for i, comp in enumerate(conn_comp) if node_1 in comp][0]
-    con_2 = [i for i, comp in enumerate(conn_comp) if node_2 in comp][0]
-    if con_1 == con_2:
-        shortest_path = bidirectional_shortest_path(graph, node_1, node_2)
-        dist = len(shortest_path)
-        return dist >= min_distance
-    else:
-        return True
+    if edges is None or len(edges) == 0:
+        return np.zeros(pairs.shape[1], dtype=bool)
+    edges = np.asarray(edges, dtype=np.int64)
+    if edges.size == 0:
+        return np.zeros(pairs.shape[1], dtype=bool)
+    return np.isin(
+        pairs[0] * n_atoms + pairs[1], edges[0] * n_atoms + edges[1]
+    )
 
 
 class StandardBonds:
@@ -215,27 +212,25 @@ class Non_Bonded:
             mlcg_top.fully_connected2torch()
         ).numpy()
         conn_mat = get_connectivity_matrix(mlcg_top).numpy()
-        graph = nx.Graph(conn_mat)
-        conn_comps = list(nx.connected_components(graph))
-        pairs_parsed = np.array(
-            [
-                p
-                for p in fully_connected_edges.T
-                if (
-                    abs(
-                        topology.atom(p[0]).residue.index
-                        - topology.atom(p[1]).residue.index
-                    )
-                    >= res_exclusion
-                )
-                and (
-                    graph.has_edge(p[0], p[1]) == False
-                    and check_graph_distance(graph, conn_comps, p[0], p[1], min_pair)
-                )
-                and not np.all(bond_edges == p[:, None], axis=0).any()
-                and not np.all(angle_edges[[0, 2], :] == p[:, None], axis=0).any()
-            ]
+        n_atoms = conn_mat.shape[0]
+
+        # number of bonds along the shortest path between all atoms, only needed
+        # up to min_pair (atoms further apart or disconnected are set to inf)
+        graph_distances = dijkstra(
+            conn_mat, directed=False, unweighted=True, limit=min_pair
         )
+        res_indices = np.array([atom.residue.index for atom in topology.atoms])
+
+        atom_1, atom_2 = fully_connected_edges
+        pair_mask = np.abs(res_indices[atom_1] - res_indices[atom_2]) >= res_exclusion
+        pair_mask &= conn_mat[atom_1, atom_2] == 0
+        pair_mask &= graph_distances[atom_1, atom_2] + 1 >= min_pair
+        pair_mask &= ~pairs_in_edges(fully_connected_edges, bond_edges, n_atoms)
+        if angle_edges is not None and len(angle_edges) != 0:
+            pair_mask &= ~pairs_in_edges(
+                fully_connected_edges, np.asarray(angle_edges)[[0, 2], :], n_atoms
+            )
+        pairs_parsed = fully_connected_edges[:, pair_mask].T
 
         non_bonded_edges = torch.tensor(pairs_parsed.T)
         non_bonded_edges = torch.unique(
@@ -1,16 +1,16 @@
 import mdtraj as md
 import pickle
 
-from typing import List, Dict, Tuple, Optional, Union
+from typing import Any, Callable, List, Dict, Tuple, Optional, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy
 import numpy as np
 import torch
 import warnings
 import os
+import functools
 from importlib import import_module
 
-from torch_geometric.data.collate import collate
-
 from mlcg.neighbor_list.neighbor_list import make_neighbor_list
 from mlcg.data.atomic_data import AtomicData
 
@@ -28,20 +28,143 @@ def get_strides(n_structure: int, batch_size: int):
     """
     Helper function to stride batched data
     """
-    n_elem, remain = np.divmod(n_structure, batch_size)
-    assert remain > -1, f"remain: {remain}"
-    if remain == 0:
-        batches = np.zeros(n_elem + 1)
-        batches[1:] = batch_size
-    else:
-        batches = np.zeros(n_elem + 2)
-        batches[1:-1] = batch_size
-        batches[-1] = remain
-    strides = np.cumsum(batches, dtype=int)
-    strides = np.vstack([strides[:-1], strides[1:]]).T
+    starts = np.arange(0, n_structure, batch_size, dtype=np.int64)
+    ends = np.minimum(starts + batch_size, n_structure)
+    strides = np.stack([starts, ends], axis=1)
     return strides
 
 
+def load_cg_data(save_templ: str, key: str = "cg_embeds") -> np.ndarray:
+    """
+    Helper function to load a single per-sample array saved by `save_cg_output`;
+    falls back to the legacy layout with one `.npy` file per array
+    """
+    if os.path.exists(f"{save_templ}cg_data.npz"):
+        # only the requested array is read from the archive
+        with np.load(f"{save_templ}cg_data.npz") as cg_data:
+            return cg_data[key]
+    return np.load(f"{save_templ}{key}.npy")
+
+
+def collate_topology(
+    n_frames: int,
+    atom_types: torch.Tensor,
+    edge_index_dict: Dict[str, torch.Tensor],
+    neighbor_list: Dict,
+) -> Dict:
+    """
+    Helper function to build the fields of a collated AtomicData batch that only
+    depend on the topology shared by all frames and on the number of frames
+    """
+    n_atoms = atom_types.shape[0]
+    device = atom_types.device
+    frame_offsets = torch.arange(n_frames, device=device) * n_atoms
+
+    collated_nls = {}
+    for tag, nl in neighbor_list.items():
+        edges = edge_index_dict[tag]
+        mapping = (edges.unsqueeze(1) + frame_offsets[None, :, None]).reshape(
+            edges.shape[0], -1
+        )
+        collated_nls[tag] = dict(nl, index_mapping=mapping)
+
+    return dict(
+        atom_types=atom_types.repeat(n_frames),
+        n_atoms=torch.full((n_frames,), n_atoms, dtype=torch.long, device=device),
+        neighbor_list=collated_nls,
+        batch=torch.arange(n_frames, device=device).repeat_interleave(n_atoms),
+        ptr=torch.arange(n_frames + 1, device=device) * n_atoms,
+    )
+
+
+class SharedTopologyBatch:
+    """
+    Batch of frames of a single molecule holding one copy of the topology shared
+    by all frames, instead of replicating it for each frame
+
+    Attributes
+    ----------
+    pos: [batch_size, n_atoms, 3]
+        Coarse grained coordinates of each frame
+    atom_types: [n_atoms]
+        Atom embeddings shared by all frames
+    edge_index_dict:
+        Dictionary of prior edges shared by all frames
+    neighbor_list:
+        Dictionary of prior neighbour list of a single frame
+    batch_size:
+        Number of frames in batch
+    forces: [batch_size, n_atoms, 3]
+        Coarse grained forces of each frame, if present
+    weights: [batch_size]
+        Frame weights, if present
+    collated_topology:
+        Precomputed output of `collate_topology` for this batch, if available
+    """
+
+    def __init__(
+        self,
+        pos: torch.Tensor,
+        atom_types: torch.Tensor,
+        edge_index_dict: Dict[str, torch.Tensor],
+        neighbor_list: Dict,
+        forces: Optional[torch.Tensor] = None,
+        weights: Optional[torch.Tensor] = None,
+        collated_topology: Optional[Dict] = None,
+    ) -> None:
+        self.pos = pos
+        self.atom_types = atom_types
+        self.edge_index_dict = edge_index_dict
+        self.neighbor_list = neighbor_list
+        self.batch_size = pos.shape[0]
+        self.forces = forces
+        self.weights = weights
+        self.collated_topology = collated_topology
+        self._flat = None
+
+    def to(self, device: Union[str, torch.device]):
+        """
+        Moves all tensors of the batch to the given device
+        """
+        self.pos = self.pos.to(device)
+        self.atom_types = self.atom_types.to(device)
+        self.edge_index_dict = {
+            tag: edges.to(device) for tag, edges in self.edge_index_dict.items()
+        }
+        if self.forces is not None:
+            self.forces = self.forces.to(device)
+        if self.weights is not None:
+            self.weights = self.weights.to(device)
+        self.collated_topology = None
+        self._flat = None
+        return self
+
+    def to_flat(self) -> AtomicData:
+        """
+        Returns the equivalent collated AtomicData object, in which all frames are
+        concatenated and the prior edges are offset for each frame.
+        The result is built once and cached.
+        """
+        if self._flat is not None:
+            return self._flat
+
+        if self.collated_topology is None:
+            self.collated_topology = collate_topology(
+                self.batch_size,
+                self.atom_types,
+                self.edge_index_dict,
+                self.neighbor_list,
+            )
+        dd = dict(self.collated_topology, pos=self.pos.reshape(-1, 3))
+        if self.forces is not None:
+            dd["forces"] = self.forces.reshape(-1, 3)
+        if self.weights is not None:
+            dd["weights"] = self.weights
+
+        self._flat = AtomicData(**dd)
+        return self._flat
+
+
 class CGDataBatch:
     """
     Splits input CG data into batches for further memory-efficient processing
@@ -62,6 +185,17 @@ class CGDataBatch:
         Atom embeddings
     cg_prior_nls:
         Dictionary of prior neighbour list
+    shared_topology:
+        If True, batches are returned as SharedTopologyBatch objects holding a
+        single copy of the prior neighbour lists, otherwise as collated AtomicData
+    device:
+        Device to which batches are sent; if None, batches are kept on CPU
+    pin_memory:
+        If True, frames of each batch are copied to pinned host memory so that
+        the transfer to `device` can be done asynchronously
+    dtype:
+        Floating point type of the coordinates and forces in each batch;
+        torch.bfloat16 can be used for training on hardware supporting it
     """
 
     def __init__(
@@ -74,21 +208,49 @@ class CGDataBatch:
         stride: int,
         weights: Optional[np.ndarray] = None,
         concat_forces: bool = False,
+        shared_topology: bool = False,
+        device: Optional[Union[str, torch.device]] = None,
+        pin_memory: bool = False,
+        dtype: torch.dtype = torch.float32,
     ) -> None:
         self.batch_size = batch_size
         self.stride = stride
         self.concat_forces = concat_forces
-        self.cg_coords = torch.from_numpy(cg_coords[::stride])
-        self.cg_forces = torch.from_numpy(cg_forces[::stride])
+        self.shared_topology = shared_topology
+        self.device = device
+        self.pin_memory = pin_memory
+        self.dtype = dtype
+        # coordinates and forces are kept as (possibly memory-mapped) arrays and
+        # only the frames of each batch are materialized as tensors
+        self.cg_coords = cg_coords[::stride]
+        self.cg_forces = cg_forces[::stride]
         self.cg_embeds = torch.from_numpy(cg_embeds)
         self.cg_prior_nls = cg_prior_nls
         if isinstance(weights, np.ndarray):
-            self.weights = torch.from_numpy(weights[::stride])
+            # weights are copied so that they can be renormalized in place
+            self.weights = torch.tensor(weights[::stride])
             if stride != 1:
-                self.weights = self.weights/torch.sum(self.weights)
+                # integer weights are normalized in the default floating dtype
+                if not self.weights.is_floating_point():
+                    self.weights = self.weights.to(torch.get_default_dtype())
+                torch.div(self.weights, self.weights.sum(), out=self.weights)
         else:
             self.weights = None
 
+        # all frames share the same topology, so the prior edges are converted
+        # only once and offset for each frame when batches are collated
+        self.prior_edges = {
+            tag: torch.as_tensor(nl["index_mapping"], dtype=torch.long)
+            for tag, nl in self.cg_prior_nls.items()
+        }
+        if self.device is not None:
+            self.cg_embeds = self.cg_embeds.to(self.device)
+            self.prior_edges = {
+                tag: edges.to(self.device) for tag, edges in self.prior_edges.items()
+            }
+            if self.weights is not None:
+                self.weights = self.weights.to(self.device)
+
         self.n_structure = self.cg_coords.shape[0]
         if batch_size > self.n_structure:
             self.batch_size = self.n_structure
@@ -96,37 +258,218 @@ class CGDataBatch:
         self.strides = get_strides(self.n_structure, self.batch_size)
         self.n_elem = self.strides.shape[0]
 
+        # the collated topology is the same for all full batches, so it is built
+        # once here and only sliced for the last (possibly shorter) batch
+        self.collated_topology = collate_topology(
+            self.batch_size, self.cg_embeds, self.prior_edges, self.cg_prior_nls
+        )
+
     def __len__(self):
         return self.n_elem
 
+    def _load_frames(self, frames: np.ndarray) -> torch.Tensor:
+        """
+        Materializes a slice of frames as a tensor on the target device
+        """
+        # frames are made contiguous here so that flattening them to [n_frames * n_atoms, 3]
+        # in `SharedTopologyBatch.to_flat` is a view
+        if frames.flags.writeable:
+            # contiguous in-memory frames are wrapped without a copy, strided ones are
+            # gathered once
+            frames = torch.from_numpy(np.ascontiguousarray(frames)).to(dtype=self.dtype)
+        else:
+            # read-only (memory-mapped) frames are copied once, in the target dtype
+            frames = torch.tensor(frames, dtype=self.dtype)
+        if self.pin_memory:
+            frames = frames.pin_memory()
+        if self.device is not None:
+            frames = frames.to(self.device, non_blocking=self.pin_memory)
+        return frames
+
+    def _get_collated_topology(self, n_frames: int) -> Dict:
+        """
+        Returns the precomputed collated topology restricted to `n_frames` frames
+
+        Each batch gets its own dictionaries, so that adding or removing entries of
+        one batch does not affect the others; the tensors are views of the
+        precomputed ones and should not be modified in place.
+        """
+        # frames are concatenated in order, so the first n_frames frames of the
+        # full batch are a prefix of each field
+        n_nodes = n_frames * self.cg_embeds.shape[0]
+        neighbor_list = {
+            tag: dict(
+                nl,
+                index_mapping=nl["index_mapping"][
+                    :, : n_frames * self.prior_edges[tag].shape[1]
+                ],
+            )
+            for tag, nl in self.collated_topology["neighbor_list"].items()
+        }
+        return dict(
+            atom_types=self.collated_topology["atom_types"][:n_nodes],
+            n_atoms=self.collated_topology["n_atoms"][:n_frames],
+            neighbor_list=neighbor_list,
+            batch=self.collated_topology["batch"][:n_nodes],
+            ptr=self.collated_topology["ptr"][: n_frames + 1],
+        )
+
+    def get_frames(self, st: int, nd: int) -> SharedTopologyBatch:
+        """
+        Returns the frames between `st` and `nd` (at most `batch_size` of them)
+        as a SharedTopologyBatch
+        """
+        return SharedTopologyBatch(
+            pos=self._load_frames(self.cg_coords[st:nd]),
+            atom_types=self.cg_embeds,
+            edge_index_dict=self.prior_edges,
+            neighbor_list=self.cg_prior_nls,
+            forces=(
+                self._load_frames(self.cg_forces[st:nd])
+                if self.concat_forces
+                else None
+            ),
+            weights=self.weights[st:nd] if isinstance(self.weights, torch.Tensor) else None,
+            collated_topology=self._get_collated_topology(nd - st),
+        )
+
     def __getitem__(self, idx):
         """
-        Returns list of AtomicData objects for indexed batch
+        Returns collated AtomicData object for indexed batch, or the corresponding
+        SharedTopologyBatch if `shared_topology` is True
         """
         st, nd = self.strides[idx]
-        data_list = []
-        # TODO: build the collated AtomicData by hand to avoid copy/concat ops
-        for ii in range(st, nd):
-            dd = dict(
-                pos=self.cg_coords[ii],
-                atom_types=self.cg_embeds,
-                masses=None,
-                neighborlist=self.cg_prior_nls,
+        batch = self.get_frames(st, nd)
+        if self.shared_topology:
+            return batch
+        return batch.to_flat()
+
+
+class MultiSampleCGDataBatch:
+    """
+    Splits input CG data of several molecules into batches, where each batch is the
+    disjoint union of the graphs of its frames, possibly from different molecules
+
+    Frames of all samples are enumerated one sample after the other; in each batch,
+    the prior edges of every sample (already offset for each of its frames) are
+    offset by the number of beads of the preceding samples in the batch.
+
+    Attributes
+    ----------
+    batch_size:
+        Number of frames to use in each batch
+    stride:
+        Integer by which to stride frames
+    samples:
+        List of CGDataBatch objects of each sample
+    sample_offsets:
+        Index of the first frame of each sample in the enumeration of all frames
+    """
+
+    def __init__(
+        self,
+        cg_coords: List[np.ndarray],
+        cg_forces: List[np.ndarray],
+        cg_embeds: List[np.ndarray],
+        cg_prior_nls: List[Dict],
+        batch_size: int,
+        stride: int,
+        weights: Optional[List[np.ndarray]] = None,
+        concat_forces: bool = False,
+        device: Optional[Union[str, torch.device]] = None,
+        pin_memory: bool = False,
+        dtype: torch.dtype = torch.float32,
+    ) -> None:
+        self.batch_size = batch_size
+        self.stride = stride
+        if weights is None:
+            weights = [None] * len(cg_coords)
+        self.samples = [
+            CGDataBatch(
+                coords,
+                forces,
+                embeds,
+                prior_nls,
+                batch_size,
+                stride,
+                sample_weights,
+                concat_forces=concat_forces,
+                device=device,
+                pin_memory=pin_memory,
+                dtype=dtype,
+            )
+            for coords, forces, embeds, prior_nls, sample_weights in zip(
+                cg_coords, cg_forces, cg_embeds, cg_prior_nls, weights
             )
-            if self.concat_forces:
-                dd["forces"] = self.cg_forces[ii]
-
-            data = AtomicData.from_points(**dd)
-            if isinstance(self.weights, torch.Tensor):
-                data.weights = self.weights[ii]
-            data_list.append(data)
-        datas, slices, _ = collate(
-            data_list[0].__class__,
-            data_list=data_list,
-            increment=True,
-            add_batch=True,
+        ]
+
+        n_frames = np.array([sample.n_structure for sample in self.samples])
+        self.sample_offsets = np.concatenate([[0], np.cumsum(n_frames)])
+        self.n_structure = int(self.sample_offsets[-1])
+        if batch_size > self.n_structure:
+            self.batch_size = self.n_structure
+
+        self.strides = get_strides(self.n_structure, self.batch_size)
+        self.n_elem = self.strides.shape[0]
+
+    def __len__(self):
+        return self.n_elem
+
+    def __getitem__(self, idx):
+        """
+        Returns collated AtomicData object for indexed batch
+        """
+        st, nd = self.strides[idx]
+        first = np.searchsorted(self.sample_offsets, st, side="right") - 1
+        last = np.searchsorted(self.sample_offsets, nd, side="left")
+
+        datas = []
+        for ii in range(first, last):
+            sample_st = max(st, self.sample_offsets[ii]) - self.sample_offsets[ii]
+            sample_nd = min(nd, self.sample_offsets[ii + 1]) - self.sample_offsets[ii]
+            if sample_nd > sample_st:
+                data = self.samples[ii].get_frames(sample_st, sample_nd)
+                datas.append(data.to_flat())
+
+        node_offsets = np.cumsum([0] + [data.pos.shape[0] for data in datas])
+        frame_offsets = np.cumsum([0] + [data.n_atoms.shape[0] for data in datas])
+
+        neighbor_list = {}
+        for data, node_offset in zip(datas, node_offsets):
+            for tag, nl in data.neighbor_list.items():
+                if tag not in neighbor_list:
+                    neighbor_list[tag] = dict(nl, index_mapping=[])
+                neighbor_list[tag]["index_mapping"].append(
+                    nl["index_mapping"] + int(node_offset)
+                )
+        for nl in neighbor_list.values():
+            nl["index_mapping"] = torch.cat(nl["index_mapping"], dim=1)
+
+        dd = dict(
+            pos=torch.cat([data.pos for data in datas]),
+            atom_types=torch.cat([data.atom_types for data in datas]),
+            n_atoms=torch.cat([data.n_atoms for data in datas]),
+            neighbor_list=neighbor_list,
+            batch=torch.cat(
+                [
+                    data.batch + int(frame_offset)
+                    for data, frame_offset in zip(datas, frame_offsets)
+                ]
+            ),
+            ptr=torch.cat(
+                [
+                    data.ptr[:-1] + int(node_offset)
+                    for data, node_offset in zip(datas, node_offsets)
+                ]
+                + [datas[-1].ptr[-1:] + int(node_offsets[-2])]
+            ),
         )
-        return datas
+        if all("forces" in data for data in datas):
+            dd["forces"] = torch.cat([data.forces for data in datas])
+        if all("weights" in data for data in datas):
+            dd["weights"] = torch.cat([data.weights for data in datas])
+
+        return AtomicData(**dd)
 
 
 class SampleCollection:
@@ -151,6 +494,44 @@ class SampleCollection:
         self.name = name
         self.tag = tag
 
+    @property
+    def cg_map(self) -> np.ndarray:
+        """
+        Dense [n_cg_atoms, n_atomistic_atoms] slice mapping matrix, built on demand
+        from `cg_atom_indices`
+        """
+        cg_map = np.zeros((len(self.cg_atom_indices), self.input_traj.n_atoms))
+        cg_map[np.arange(len(self.cg_atom_indices)), self.cg_atom_indices] = 1
+        return cg_map
+
+    @functools.cached_property
+    def cg_topology(self) -> md.Topology:
+        """
+        CG topology sliced from the atomistic topology and used to build prior
+        neighbour lists; computed once per call of `apply_cg_mapping`
+        """
+        cg_top = self.input_traj.atom_slice(self.cg_atom_indices).topology
+
+        # we need to add an extra step for CA case: in this situation, the bonds
+        atoms = list(cg_top.atoms)
+        unique_atom_types = set([atom.name for atom in atoms])
+        if unique_atom_types == set(["CA"]):
+            # iterate over chains
+            for chain in cg_top.chains:
+                ch_atoms = list(chain.atoms)
+                # iterate over CA atoms in each chain and add bonds between them 
+                for i, _ in enumerate(ch_atoms[:-1]):
+                    cg_top.add_bond(ch_atoms[i], ch_atoms[i + 1])
+        return cg_top
+
+    @functools.cached_property
+    def cg_structure_topology(self) -> md.Topology:
+        """
+        CG topology built from `cg_dataframe` and used for saved structures;
+        computed once per call of `apply_cg_mapping`
+        """
+        return md.Topology.from_dataframe(self.cg_dataframe)
+
     def apply_cg_mapping(
         self,
         cg_atoms: List[str],
@@ -176,17 +557,15 @@ class SampleCollection:
         if isinstance(embedding_dict, str):
             self.embedding_dict = eval(embedding_dict)
 
-        self.top_dataframe = self.top_dataframe.apply(
-            map_cg_topology,
-            axis=1,
+        self.top_dataframe = map_cg_topology(
+            self.top_dataframe,
             cg_atoms=cg_atoms,
             embedding_function=embedding_function,
             skip_residues=skip_residues,
         )
         cg_df = deepcopy(self.top_dataframe.loc[self.top_dataframe["mapped"] == True])
 
-        cg_atom_idx = cg_df.index.values.tolist()
-        self.cg_atom_indices = cg_atom_idx
+        self.cg_atom_indices = cg_df.index.to_numpy(dtype=np.int64)
 
         cg_df.index = [i for i in range(len(cg_df.index))]
         cg_df.serial = [i + 1 for i in range(len(cg_df.index))]
@@ -199,20 +578,24 @@ class SampleCollection:
         # See https://github.com/ClementiGroup/mlcg-playground/pull/9
         # for more details
         #
-        cg_df.resSeq = [
-            cg_df.resSeq[i] + cg_df.value_counts("chainID")[0 : cg_df.chainID[i]].sum()
-            for i in range(len(cg_df.resSeq))
-        ]
+        chain_sizes = cg_df.groupby("chainID", sort=True).size()
+        chain_offsets = chain_sizes.cumsum().shift(fill_value=0)
+        cg_df.resSeq = cg_df.resSeq.values + cg_df.chainID.map(chain_offsets).values
         self.cg_dataframe = cg_df
 
-        cg_map = np.zeros((len(cg_atom_idx), self.input_traj.n_atoms))
-        cg_map[[i for i in range(len(cg_atom_idx))], cg_atom_idx] = 1
-        if not all([sum(row) == 1 for row in cg_map]):
+        # each row of the slice map holds a single 1 at a valid atom index, and
+        # no atomistic atom should be shared between CG beads
+        if np.unique(self.cg_atom_indices).shape != self.cg_atom_indices.shape:
             warnings.warn("WARNING: Slice mapping matrix is not unique.")
-        if not all([row.tolist().count(1) == 1 for row in cg_map]):
+        if not np.all(
+            (self.cg_atom_indices >= 0)
+            & (self.cg_atom_indices < self.input_traj.n_atoms)
+        ):
             warnings.warn("WARNING: Slice mapping matrix is not linear.")
 
-        self.cg_map = cg_map
+        # cached CG topologies refer to the previous mapping, if any
+        self.__dict__.pop("cg_topology", None)
+        self.__dict__.pop("cg_structure_topology", None)
 
         # save N_term and C_term as None, to be overwritten if terminal embeddings used
         self.N_term = None
@@ -238,47 +621,29 @@ class SampleCollection:
         self.N_term = N_term
         self.C_term = C_term
 
-        chains = df_cg.chainID.unique()
+        # as the search for N- and C- is based on resseq, the terminal
+        # residues are found separately for each chain
+        chain_resseq = df_cg.groupby("chainID")["resSeq"]
         if N_term is not None:
             if "N_term" not in self.embedding_dict:
                 self.embedding_dict["N_term"] = max(self.embedding_dict.values()) + 1
-            N_term_atom = []
-            # as the search for N- and C- is based on resseq, we need to proceed
-            # chain by chain
-            for chain in chains:
-                chain_filter = df_cg["chainID"] == chain
-                chain_resseq_min = df_cg[chain_filter]["resSeq"].min()
-                N_term_atom.extend(
-                    df_cg.loc[
-                        (df_cg["resSeq"] == chain_resseq_min)
-                        & (df_cg["name"] == N_term)
-                        & chain_filter
-                    ].index.to_list()
-                )
-            for idx in N_term_atom:
-                self.cg_dataframe.at[idx, "type"] = self.embedding_dict["N_term"]
+            N_term_mask = (df_cg["resSeq"] == chain_resseq.transform("min")) & (
+                df_cg["name"] == N_term
+            )
+            self.cg_dataframe.loc[N_term_mask, "type"] = self.embedding_dict["N_term"]
 
         if C_term is not None:
             if "C_term" not in self.embedding_dict:
                 self.embedding_dict["C_term"] = max(self.embedding_dict.values()) + 1
-            C_term_atom = []
-            for chain in chains:
-                chain_filter = df_cg["chainID"] == chain
-                chain_resseq_max = df_cg[chain_filter]["resSeq"].max()
-                C_term_atom.extend(
-                    df_cg.loc[
-                        (df_cg["resSeq"] == chain_resseq_max)
-                        & (df_cg["name"] == C_term)
-                        & chain_filter
-                    ].index.to_list()
-                )
-            for idx in C_term_atom:
-                self.cg_dataframe.at[idx, "type"] = self.embedding_dict["C_term"]
+            C_term_mask = (df_cg["resSeq"] == chain_resseq.transform("max")) & (
+                df_cg["name"] == C_term
+            )
+            self.cg_dataframe.loc[C_term_mask, "type"] = self.embedding_dict["C_term"]
 
     def process_coords_forces(
         self,
-        coords: np.ndarray,
-        forces: np.ndarray,
+        coords: Union[np.ndarray, str],
+        forces: Union[np.ndarray, str],
         mapping: str = "slice_aggregate",
         force_stride: int = 100,
         batch_size: Optional[int] = None,
@@ -289,9 +654,9 @@ class SampleCollection:
         Parameters
         ----------
         coords: [n_frames, n_atoms, 3]
-            Atomistic coordinates
+            Atomistic coordinates, or path to a .npy file which will be memory-mapped
         forces: [n_frames, n_atoms, 3]
-            Atomistic forces
+            Atomistic forces, or path to a .npy file which will be memory-mapped
         mapping:
             Mapping scheme to be used, must be either 'slice_aggregate' or 'slice_optimize'.
         force_stride:
@@ -303,6 +668,10 @@ class SampleCollection:
         -------
         Tuple of np.ndarray's for coarse grained coordinates and forces
         """
+        if isinstance(coords, str):
+            coords = np.load(coords, mmap_mode="r")
+        if isinstance(forces, str):
+            forces = np.load(forces, mmap_mode="r")
         if coords.shape != forces.shape:
             warnings.warn(
                 "Cannot process coordinates and forces: mismatch between array shapes."
@@ -310,7 +679,7 @@ class SampleCollection:
             return
         else:
             cg_coords, cg_forces, force_map = slice_coord_forces(
-                coords, forces, self.cg_map, mapping, force_stride, batch_size
+                coords, forces, self.cg_atom_indices, mapping, force_stride, batch_size
             )
 
             self.force_map = force_map
@@ -340,6 +709,10 @@ class SampleCollection:
             CG coordinates; if None, will check whether these are saved as attribute.
         cg_forces:
             CG forces; if None, will check whether these are saved as an object attribute.
+
+        Embeddings and CG maps are saved together in a single `cg_data.npz` file, while
+        coordinates and forces are saved as separate `.npy` files so that they can be
+        memory-mapped when loaded.
         """
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
@@ -349,48 +722,57 @@ class SampleCollection:
             return
 
         save_templ = os.path.join(save_dir, get_output_tag([self.tag, self.name], placement="before"))
-        cg_xyz = self.input_traj.atom_slice(self.cg_atom_indices).xyz
-        cg_traj = md.Trajectory(cg_xyz, md.Topology.from_dataframe(self.cg_dataframe))
+        cg_xyz = self.input_traj.xyz[:, self.cg_atom_indices, :]
+        cg_traj = md.Trajectory(cg_xyz, self.cg_structure_topology)
         cg_traj.save_pdb(f"{save_templ}cg_structure.pdb")
 
-        embeds = np.array(self.cg_dataframe["type"].to_list())
-        np.save(f"{save_templ}cg_embeds.npy", embeds)
+        cg_data = {"cg_embeds": np.array(self.cg_dataframe["type"].to_list())}
 
         if save_coord_force:
-            if cg_coords == None:
+            # coordinates and forces are always stored in single precision
+            if cg_coords is None:
                 if not hasattr(self, "cg_coords"):
                     print(
                         "No coordinates found; only CG structure, embeddings and loaded forces will be saved."
                     )
                 else:
-                    np.save(f"{save_templ}cg_coords.npy", self.cg_coords)
+                    np.save(
+                        f"{save_templ}cg_coords.npy",
+                        self.cg_coords.astype(np.float32, copy=False),
+                    )
             else:
-                np.save(f"{save_templ}cg_coords.npy", cg_coords)
+                np.save(
+                    f"{save_templ}cg_coords.npy", cg_coords.astype(np.float32, copy=False)
+                )
 
-            if cg_forces == None:
+            if cg_forces is None:
                 if not hasattr(self, "cg_forces"):
                     print(
                         "No forces found;  only CG structure, embeddings, and loaded coordinates will be saved."
                     )
                 else:
-                    np.save(f"{save_templ}cg_forces.npy", self.cg_forces)
+                    np.save(
+                        f"{save_templ}cg_forces.npy",
+                        self.cg_forces.astype(np.float32, copy=False),
+                    )
             else:
-                np.save(f"{save_templ}cg_forces.npy", cg_forces)
+                np.save(
+                    f"{save_templ}cg_forces.npy", cg_forces.astype(np.float32, copy=False)
+                )
 
         if save_cg_maps:
-            if not hasattr(self, "cg_map"):
-                print(
-                    "No cg coordinate map found. Skipping save."
-                )
-            else:
-                np.save(f"{save_templ}cg_coord_map.npy", self.cg_map)
+            # the coordinate map is a slice, stored by its atom indices
+            cg_data["cg_atom_indices"] = self.cg_atom_indices
+            cg_data["n_atoms"] = np.array(self.input_traj.n_atoms)
 
             if not hasattr(self, "force_map"):
                 print(
                     "No cg force map found. Skipping save."
                 )
             else:
-                np.save(f"{save_templ}cg_force_map.npy", self.force_map)
+                cg_data["cg_force_map"] = self.force_map
+
+        np.savez(f"{save_templ}cg_data.npz", **cg_data)
 
 
     def get_prior_nls(
@@ -464,33 +846,14 @@ class SampleCollection:
                 )
 
         # get atom groups for edges and orders for all prior terms
-        cg_top = self.input_traj.atom_slice(self.cg_atom_indices).topology
-
-        # we need to add an extra step for CA case: in this situation, the bonds
-        atoms = list(cg_top.atoms)
-        unique_atom_types = set([atom.name for atom in atoms])
-        if unique_atom_types == set(["CA"]):
-            # iterate over chains
-            for chain in cg_top.chains:
-                ch_atoms = list(chain.atoms)
-                # iterate over CA atoms in each chain and add bonds between them 
-                for i, _ in enumerate(ch_atoms[:-1]):
-                    cg_top.add_bond(ch_atoms[i], ch_atoms[i + 1])
-
         all_edges_and_orders = get_edges_and_orders(
             prior_builders,
-            topology=cg_top,
+            topology=self.cg_topology,
         )
         tags = [x[0] for x in all_edges_and_orders]
         orders = [x[1] for x in all_edges_and_orders]
-        edges = [
-            (
-                torch.tensor(x[2]).type(torch.LongTensor)
-                if isinstance(x[2], np.ndarray)
-                else x[2].type(torch.LongTensor)
-            )
-            for x in all_edges_and_orders
-        ]
+        # no copy is made for edges that are already int64, whether numpy or torch
+        edges = [torch.as_tensor(x[2], dtype=torch.long) for x in all_edges_and_orders]
         prior_nls = {}
         for tag, order, edge in zip(tags, orders, edges):
             nl = make_neighbor_list(tag, order, edge)
@@ -520,12 +883,13 @@ class SampleCollection:
         Returns
         -------
         Tuple of np.ndarrays containing coarse grained coordinates, forces, embeddings,
-        structure, and prior neighbour list
+        structure, and prior neighbour list; coordinates and forces are memory-mapped
+        in read-only mode
         """
         save_templ = os.path.join(save_dir, get_output_tag([self.tag, self.name], placement="before"))
-        cg_coords = np.load(f"{save_templ}cg_coords.npy")
-        cg_forces = np.load(f"{save_templ}cg_forces.npy")
-        cg_embeds = np.load(f"{save_templ}cg_embeds.npy")
+        cg_coords = np.load(f"{save_templ}cg_coords.npy", mmap_mode="r")
+        cg_forces = np.load(f"{save_templ}cg_forces.npy", mmap_mode="r")
+        cg_embeds = load_cg_data(save_templ, "cg_embeds")
         cg_pdb = md.load(f"{save_templ}cg_structure.pdb")
         # load NLs
         ofile =  f"{save_templ}prior_nls{get_output_tag(prior_tag, placement='after')}.pkl"
@@ -541,6 +905,9 @@ class SampleCollection:
         batch_size: int,
         stride: int,
         weights_template_fn: Optional[str],
+        device: Optional[Union[str, torch.device]] = None,
+        pin_memory: bool = False,
+        dtype: torch.dtype = torch.float32,
     ):
         """
         Loads saved CG data nad splits these into batches for further processing
@@ -555,6 +922,12 @@ class SampleCollection:
             Number of frames to use in each batch
         stride:
             Integer by which to stride frames
+        device:
+            Device to which batches are sent; if None, batches are kept on CPU
+        pin_memory:
+            If True, batches are staged in pinned memory for asynchronous transfer to `device`
+        dtype:
+            Floating point type of the coordinates and forces in each batch
 
         Returns
         -------
@@ -571,7 +944,16 @@ class SampleCollection:
         else:
             weights = None
         batch_list = CGDataBatch(
-            cg_coords, cg_forces, cg_embeds, cg_prior_nls, batch_size, stride, weights
+            cg_coords,
+            cg_forces,
+            cg_embeds,
+            cg_prior_nls,
+            batch_size,
+            stride,
+            weights,
+            device=device,
+            pin_memory=pin_memory,
+            dtype=dtype,
         )
         return batch_list
     
@@ -589,13 +971,14 @@ class SampleCollection:
         Returns
         -------
         Tuple of np.ndarrays containing coarse grained coordinates, delta forces, and embeddings,
+        where coordinates and delta forces are read-only memory-mapped arrays
         """
         save_templ = os.path.join(training_data_dir, get_output_tag([self.tag, self.name], placement="before"))
-        cg_coords = np.load(f"{save_templ}cg_coords.npy")[::stride]
-        cg_embeds = np.load(f"{save_templ}cg_embeds.npy")
+        cg_coords = np.load(f"{save_templ}cg_coords.npy", mmap_mode="r")[::stride]
+        cg_embeds = load_cg_data(save_templ, "cg_embeds")
 
         save_templ_forces = os.path.join(training_data_dir, get_output_tag([self.tag, self.name, force_tag], placement="before"))
-        cg_forces = np.load(f"{save_templ_forces}delta_forces.npy")[::stride]
+        cg_forces = np.load(f"{save_templ_forces}delta_forces.npy", mmap_mode="r")[::stride]
         
         return cg_coords, cg_forces, cg_embeds
 
@@ -635,6 +1018,40 @@ class RawDataset:
     def __len__(self):
         return len(self.dataset)
 
+    def map(
+        self,
+        fn: Callable[[SampleCollection], Any],
+        n_workers: Optional[int] = None,
+        use_processes: bool = True,
+    ) -> List[Any]:
+        """
+        Applies a function to every sample of the dataset, in parallel over samples
+
+        Parameters
+        ----------
+        fn:
+            Function processing a single SampleCollection end to end
+        n_workers:
+            Number of workers to use; if None, the default of the executor is used
+            and if 1, samples are processed serially in the current process
+        use_processes:
+            If True, samples are processed in a process pool (suited for CPU-heavy
+            steps such as the coordinate and force mapping), otherwise in a thread
+            pool (suited for IO-bound steps such as saving and loading outputs).
+            With processes, each worker operates on a copy of its sample, so any
+            output needed afterwards should be returned by `fn` (or saved to disk).
+
+        Returns
+        -------
+        List of the outputs of `fn`, in the order of the samples
+        """
+        if n_workers == 1:
+            return [fn(samples) for samples in self.dataset]
+
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_cls(max_workers=n_workers) as executor:
+            return list(executor.map(fn, self.dataset))
+
 
 class SimInput:
     """
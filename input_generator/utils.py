@@ -3,6 +3,7 @@ from typing import List, Optional, Union, Tuple, Dict
 import numpy as np
 import mdtraj as md
 from functools import wraps
+from scipy.sparse import csr_matrix
 
 from aggforce import (LinearMap, 
                     guess_pairwise_constraints, 
@@ -76,11 +77,13 @@ def map_cg_topology(
     Parameters
     ----------
     atom_df:
-        Pandas DataFrame row from mdTraj topology.
+        Pandas DataFrame from mdTraj topology.
     cg_atoms:
         List of atoms needed in CG mapping.
     embedding_function:
         Function that slices coodinates, if not provided will fail.
+        It is applied once per unique pair of atom and residue names,
+        so the assigned type should only depend on the "name" and "resName" fields.
     special_typing:
         Optional dictionary of alternative atom properties to use in assigning types instead of atom names.
     skip_residues:
@@ -90,7 +93,7 @@ def map_cg_topology(
 
     Returns
     -------
-    New DataFrame columns indicating atom involvement in CG mapping and type assignment.
+    DataFrame with new columns indicating atom involvement in CG mapping and type assignment.
 
     Example
     -------
@@ -102,8 +105,8 @@ def map_cg_topology(
     >>> embedding_function = embedding_fivebead
     >>> skip_residues = ["ACE", "NME"]
 
-    Apply row-wise function:
-    >>> top_df = top_df.apply(map_cg_topology, axis=1, cg_atoms, embedding_dict, skip_residues)
+    Apply mapping to the whole DataFrame:
+    >>> top_df = map_cg_topology(top_df, cg_atoms, embedding_function, skip_residues)
     """
     if isinstance(embedding_function, str):
         try:
@@ -111,61 +114,78 @@ def map_cg_topology(
         except NameError:
             print("The specified embedding function has not been defined.")
             exit
-    name, res = atom_df["name"], atom_df["resName"]
-    if skip_residues != None and res in skip_residues:
-        atom_df["mapped"] = False
-        atom_df["type"] = "NA"
-
-    else:
-        if name in cg_atoms:
-            atom_df["mapped"] = True
-            atom_type = embedding_function(atom_df)
-            atom_df["type"] = atom_type
-        else:
-            atom_df["mapped"] = False
-            atom_df["type"] = "NA"
+    if isinstance(skip_residues, str):
+        skip_residues = [skip_residues]
+
+    atom_df = atom_df.copy()
+    mapped = atom_df["name"].isin(cg_atoms)
+    if skip_residues != None:
+        mapped &= ~atom_df["resName"].isin(skip_residues)
+
+    # types are assigned once per unique (name, resName) pair and broadcast back
+    mapped_atoms = atom_df.loc[mapped, ["name", "resName"]]
+    unique_atoms = atom_df.loc[mapped].drop_duplicates(subset=["name", "resName"])
+    unique_atoms = unique_atoms[["name", "resName"]].assign(
+        type=[embedding_function(row) for _, row in unique_atoms.iterrows()]
+    )
+    atom_types = np.full(len(atom_df), "NA", dtype=object)
+    atom_types[mapped.to_numpy()] = mapped_atoms.merge(
+        unique_atoms, on=["name", "resName"], how="left"
+    )["type"].to_numpy()
+
+    atom_df["mapped"] = mapped
+    atom_df["type"] = atom_types
 
     return atom_df
 
 
-def batch_matmul(map_matrix, X, batch_size):
+def batch_matmul(map_matrix, X, batch_size, out=None):
     """
     Perform matrix multiplication in chunks.
+
+    Each chunk of frames is laid out as a single (N_FG_ats, batch * 3) matrix, so
+    that the map is applied with one product per chunk; this also allows
+    `map_matrix` to be a scipy sparse matrix.
     
     Parameters:
-      map_matrix: np.ndarray of shape (N_CG_ats, N_FG_ats)
+      map_matrix: np.ndarray or scipy.sparse matrix of shape (N_CG_ats, N_FG_ats)
       X: np.ndarray of shape (M_frames, N_FG_ats, 3)
       batch_size: int, the number of rows (from the M dimension) to process at a time.
+      out: optional np.ndarray of shape (M_frames, N_CG_ats, 3) in which each chunk
+        result is written; if None, it is allocated with the dtype of the product.
     
     Returns:
       result: np.ndarray of shape (M_frames, N_CG_ats, 3)
     """
-    results = []
-    M = X.shape[0]
+    M, N = X.shape[:2]
+    if out is None:
+        out = np.empty(
+            (M, map_matrix.shape[0], 3), dtype=np.result_type(map_matrix.dtype, X.dtype)
+        )
     for i in range(0, M, batch_size):
         # Slice a batch along the M dimension
         X_batch = X[i:i+batch_size]  # shape: (batch, N, 3)
-        # Perform matrix multiplication:
-        # map_matrix (CG, FG) multiplied by each X_batch (FG, 3) gives (GC, 3) for each sample.
-        # The broadcasting ensures the result is (batch, CG, 3)
-        result_batch = map_matrix @ X_batch  
-        results.append(result_batch)
-    # Concatenate all chunks along the first axis (M dimension)
-    return np.concatenate(results, axis=0)
+        # Frames are stacked along the columns, (N, batch * 3), so that
+        # map_matrix (CG, FG) maps all of them at once to (CG, batch * 3)
+        X_batch = np.ascontiguousarray(X_batch.transpose(1, 0, 2)).reshape(N, -1)
+        result_batch = np.asarray(map_matrix @ X_batch)
+        result_batch = result_batch.reshape(-1, X_batch.shape[1] // 3, 3)
+        out[i:i+batch_size] = result_batch.transpose(1, 0, 2)
+    return out
 
 
 def slice_coord_forces(
-    coords, forces, cg_map, mapping: str = "slice_aggregate", force_stride: int = 100, batch_size: Optional[int] = None
+    coords, forces, cg_atom_indices, mapping: str = "slice_aggregate", force_stride: int = 100, batch_size: Optional[int] = None
 ) -> Tuple:
     """
     Parameters
     ----------
     coords: [n_frames, n_atoms, 3]
-        Numpy array of atomistic coordinates
+        Numpy array of atomistic coordinates, can be memory-mapped
     forces: [n_frames, n_atoms, 3]
-        Numpy array of atomistic forces
-    cg_map: [n_cg_atoms, n_atomistic_atoms]
-        Linear map characterizing the atomistic to CG configurational map with shape.
+        Numpy array of atomistic forces, can be memory-mapped
+    cg_atom_indices: [n_cg_atoms]
+        Indices of the atomistic atoms preserved in the CG configurational (slice) map.
     mapping:
         Mapping scheme to be used, must be either 'slice_aggregate' or 'slice_optimize'.
     force_stride:
@@ -176,10 +196,11 @@ def slice_coord_forces(
 
     Returns
     -------
-    Coarse-grained coordinates and forces
+    Coarse-grained coordinates and forces, as float32 arrays
     """
-    config_map = LinearMap(cg_map)
-    config_map_matrix = config_map.standard_matrix
+    config_map = LinearMap(
+        [[int(idx)] for idx in cg_atom_indices], n_fg_sites=coords.shape[1]
+    )
     # taking only first 100 frames gives same results in ~1/15th of time
     constraints = guess_pairwise_constraints(coords[:100], threshold=5e-3)
     if mapping == "slice_aggregate":
@@ -208,12 +229,21 @@ def slice_coord_forces(
         )
     force_map_matrix = force_agg_results["tmap"].force_map.standard_matrix
 
-    if batch_size != None: 
-        cg_coords = batch_matmul(config_map_matrix, coords, batch_size=batch_size)
-        cg_forces = batch_matmul(force_map_matrix, forces, batch_size=batch_size)
-    else:
-        cg_coords = config_map_matrix @ coords
-        cg_forces = force_map_matrix @ forces
+    # outputs are preallocated and filled chunk by chunk, so that only one chunk
+    # of the (possibly memory-mapped) atomistic data is read in memory at a time
+    n_frames = coords.shape[0]
+    if batch_size == None:
+        batch_size = max(n_frames, 1)
+    cg_coords = np.empty((n_frames, len(cg_atom_indices), 3), dtype=np.float32)
+    cg_forces = np.empty((n_frames, len(cg_atom_indices), 3), dtype=np.float32)
+
+    # the configurational map is a slice, so it reduces to a gather of CG atoms
+    for i in range(0, n_frames, batch_size):
+        cg_coords[i:i+batch_size] = coords[i:i+batch_size, cg_atom_indices, :]
+    # each CG force only combines the forces of a few atoms (e.g. constrained
+    # hydrogens), so the force map is applied in CSR format
+    force_map_csr = csr_matrix(force_map_matrix)
+    batch_matmul(force_map_csr, forces, batch_size=batch_size, out=cg_forces)
 
     return cg_coords, cg_forces, force_map_matrix
 
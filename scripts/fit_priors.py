@@ -97,7 +97,13 @@ def compute_statistics(
             continue
 
         batch_list = samples.load_cg_output_into_batches(
-            save_dir, prior_tag, batch_size, stride, weights_template_fn=weights_template_fn,
+            save_dir,
+            prior_tag,
+            batch_size,
+            stride,
+            weights_template_fn=weights_template_fn,
+            device=device,
+            pin_memory=torch.device(device).type == "cuda",
         )
         nl_names = set(batch_list[0].neighbor_list.keys())
 
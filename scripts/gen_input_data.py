@@ -15,10 +15,55 @@ from tqdm import tqdm
 from time import ctime
 
 from typing import Dict, List, Union, Callable, Optional
+from functools import partial
 from jsonargparse import CLI
 import pickle as pck
 
 
+def process_sample(
+    samples: SampleCollection,
+    sample_loader: DatasetLoader,
+    raw_data_dir: str,
+    pdb_template_fn: str,
+    save_dir: str,
+    cg_atoms: List[str],
+    embedding_map: CGEmbeddingMap,
+    embedding_func: Callable,
+    skip_residues: List[str],
+    cg_mapping_strategy: str,
+    stride: int = 1,
+    force_stride: int = 100,
+    batch_size: Optional[int] = None
+):
+    """
+    Applies coarse-grained mapping to coordinates and forces of a single sample
+    and saves the outputs; see `process_raw_dataset` for a description of the parameters
+    """
+    samples.input_traj, samples.top_dataframe = sample_loader.get_traj_top(
+        samples.name, pdb_template_fn
+    )
+
+    samples.apply_cg_mapping(
+        cg_atoms=cg_atoms,
+        embedding_function=embedding_func,
+        embedding_dict=embedding_map,
+        skip_residues=skip_residues,
+    )
+
+    aa_coords, aa_forces = sample_loader.load_coords_forces(
+        raw_data_dir, samples.name, stride=stride
+    )
+
+    cg_coords, cg_forces = samples.process_coords_forces(
+        aa_coords, aa_forces, mapping=cg_mapping_strategy, force_stride=force_stride, batch_size=batch_size
+    )
+
+    samples.save_cg_output(save_dir, save_coord_force=True, save_cg_maps=True)
+    # the sample object will retain the output so it makes sense to delete them 
+    del samples.cg_coords
+    del samples.cg_forces
+
+
 def process_raw_dataset(
     dataset_name: str,
     names: List[str],
@@ -34,7 +79,8 @@ def process_raw_dataset(
     cg_mapping_strategy: str,
     stride: int = 1,
     force_stride: int = 100,
-    batch_size: Optional[int] = None
+    batch_size: Optional[int] = None,
+    n_workers: int = 1,
 ):
     """
     Applies coarse-grained mapping to coordinates and forces using input sample
@@ -72,33 +118,32 @@ def process_raw_dataset(
     batch_size : int
         Optional size in which performing batches of AA mapping to CG, to avoid
         memory overhead in large AA dataset
+    n_workers : int
+        Number of processes over which samples are distributed; if 1, samples
+        are processed serially
     """
     dataset = RawDataset(dataset_name, names, tag)
-    for samples in tqdm(dataset, f"Processing CG data for {dataset_name} dataset..."):
-        samples.input_traj, samples.top_dataframe = sample_loader.get_traj_top(
-            samples.name, pdb_template_fn
-        )
-
-        samples.apply_cg_mapping(
-            cg_atoms=cg_atoms,
-            embedding_function=embedding_func,
-            embedding_dict=embedding_map,
-            skip_residues=skip_residues,
-        )
-
-        aa_coords, aa_forces = sample_loader.load_coords_forces(
-            raw_data_dir, samples.name, stride=stride
-        )
-
-        cg_coords, cg_forces = samples.process_coords_forces(
-            aa_coords, aa_forces, mapping=cg_mapping_strategy, force_stride=force_stride, batch_size=batch_size
-        )
-
-        samples.save_cg_output(save_dir, save_coord_force=True, save_cg_maps=True)
-        # the sample object will retain the output so it makes sense to delete them 
-        del samples.cg_coords
-        del samples.cg_forces
-        
+    process_fn = partial(
+        process_sample,
+        sample_loader=sample_loader,
+        raw_data_dir=raw_data_dir,
+        pdb_template_fn=pdb_template_fn,
+        save_dir=save_dir,
+        cg_atoms=cg_atoms,
+        embedding_map=embedding_map,
+        embedding_func=embedding_func,
+        skip_residues=skip_residues,
+        cg_mapping_strategy=cg_mapping_strategy,
+        stride=stride,
+        force_stride=force_stride,
+        batch_size=batch_size,
+    )
+    if n_workers == 1:
+        for samples in tqdm(dataset, f"Processing CG data for {dataset_name} dataset..."):
+            process_fn(samples)
+    else:
+        print(f"Processing CG data for {dataset_name} dataset with {n_workers} workers...")
+        dataset.map(process_fn, n_workers=n_workers, use_processes=True)
 
 
 def build_neighborlists(